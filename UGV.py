@@ -2,22 +2,38 @@
 
 # Import necessary libraries
 import time
-from picamera import PiCamera
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import operator
+from functools import reduce
+from picamera2 import Picamera2
+from picamera2.allocators import DmaAllocator
+import simplejpeg
 from hcsr04sensor import HCSR04
 import serial
 import pynmea2  # For GPS parsing
 
 # --- Configuration ---
 CAMERA_CAPTURE_INTERVAL = 60  # seconds
+JPEG_QUALITY = 90
 DISTANCE_THRESHOLD = 50      # cm for object avoidance
 AQI_READ_INTERVAL = 5        # seconds
-GPS_READ_INTERVAL = 1        # second
-SERIAL_PORT = '/dev/ttyS0'   # Default serial port for UART communication
+OBSTACLE_CHECK_INTERVAL = 0.1  # seconds, longest main_loop waits for sensor data
+GPS_FIX_HISTORY = 8          # latest GPS fixes kept by the UART thread
+AQI_HISTORY = 8              # latest AQI readings kept by the UART thread
+UART_RETRY_DELAY = 0.5       # seconds to wait after a serial read error before retrying
+SERIAL_PORT = '/dev/ttyS0'   # Default serial port for UART communication (shared by PMS7003 and GPS)
 BAUDRATE = 9600
+# PMS7003 frame: start bytes, frame length, 13 data words, checksum (all big-endian)
+PMS7003_FRAME = struct.Struct('>2sH13HH')
 
 # --- Initialize Components ---
 try:
-    camera = PiCamera()
+    camera = Picamera2(allocator=DmaAllocator())  # Frames are DMA'd straight into shared buffers
+    camera.configure(camera.create_still_configuration())
+    camera.start()  # Keep the pipeline running so each capture does not restart it
     print("Camera initialized successfully.")
 except Exception as e:
     print(f"Error initializing camera: {e}")
@@ -27,35 +43,57 @@ sensor = HCSR04(trigger_pin=17, echo_pin=18, temperature=20)  # Adjust pins as n
 print("HCSR04 sensor initialized (adjust pins if needed).")
 
 try:
-    aqi_serial = serial.Serial(SERIAL_PORT, BAUDRATE)
-    print("PMS7003 sensor serial initialized.")
-except serial.SerialException as e:
-    print(f"Error initializing PMS7003 serial port {SERIAL_PORT}: {e}")
-    aqi_serial = None
-
-try:
-    gps_serial = serial.Serial(SERIAL_PORT, BAUDRATE) # Assuming GPS also uses UART
-    print("GPS serial initialized.")
+    # The port is opened once; uart_demux splits the PMS7003 frames from the GPS sentences.
+    uart_serial = serial.Serial(SERIAL_PORT, BAUDRATE)
+    print("PMS7003/GPS serial initialized.")
+    try:
+        uart_serial.set_low_latency_mode(True)  # Deliver bytes as they arrive instead of batching them
+    except (AttributeError, NotImplementedError, ValueError, OSError) as e:
+        print(f"Low latency mode not available on {SERIAL_PORT}: {e}")
 except serial.SerialException as e:
-    print(f"Error initializing GPS serial port {SERIAL_PORT}: {e}")
-    gps_serial = None
+    print(f"Error initializing serial port {SERIAL_PORT}: {e}")
+    uart_serial = None
 
 # --- Global Variables ---
 last_camera_capture = time.time()
 last_aqi_read = time.time()
-last_gps_read = time.time()
 current_location = None
+gps_fixes = deque(maxlen=GPS_FIX_HISTORY)  # (latitude, longitude, timestamp)
 pollution_data = None
+image_writer = ThreadPoolExecutor(max_workers=1)  # encodes and writes captured images off the main loop
+aqi_readings = deque(maxlen=AQI_HISTORY)
+aqi_ready = threading.Event()  # set by uart_demux when a new AQI reading is available
 
 # --- Functions ---
 
+def write_image(frame, filename):
+    """
+    Encodes a captured frame as JPEG, writes it to filename and sends it to the GCS.
+    Runs on image_writer.
+    """
+    try:
+        # The default still format (BGR888) is RGB-ordered in memory
+        jpeg = simplejpeg.encode_jpeg(frame, quality=JPEG_QUALITY, colorspace='RGB')
+        with open(filename, 'wb') as f:
+            f.write(jpeg)
+        print(f"Image saved: {filename}")
+    except Exception as e:
+        print(f"Error saving image {filename}: {e}")
+        return
+    send_data_to_gcs(image_path=filename)
+
 def capture_image():
-    """Captures an image using the Pi Camera."""
+    """
+    Captures an image using the Pi Camera.
+    Returns as soon as the frame is captured; the file is written in the background
+    and sent to the GCS once it exists.
+    """
     if camera:
         try:
             timestamp = time.strftime("%Y%m%d-%H%M%S")
             filename = f"/home/pi/images/capture_{timestamp}.jpg"  # Adjust path as needed
-            camera.capture(filename)
+            frame = camera.capture_array()
+            image_writer.submit(write_image, frame, filename)
             print(f"Image captured: {filename}")
             return filename
         except Exception as e:
@@ -70,52 +108,139 @@ def check_distance():
         return distance
     return None
 
-def read_aqi():
-    """Reads data from the PMS7003 AQI sensor."""
+def read_aqi(header):
+    """Reads the rest of a PMS7003 AQI sensor frame whose two start bytes have already been read."""
     global pollution_data
-    if aqi_serial:
+    if uart_serial:
         try:
-            if aqi_serial.in_waiting >= 32:  # PMS7003 sends 32 bytes of data
-                data = aqi_serial.read(32)
-                if len(data) == 32 and data[0:2] == b'\x42\x4d':
-                    pm1_0 = int.from_bytes(data[2:4], 'big')
-                    pm2_5 = int.from_bytes(data[4:6], 'big')
-                    pm10 = int.from_bytes(data[6:8], 'big')
-                    pollution_data = {"pm1_0": pm1_0, "pm2_5": pm2_5, "pm10": pm10}
-                    print(f"AQI Data: PM1.0={pm1_0}, PM2.5={pm2_5}, PM10={pm10}")
-                    return pollution_data
-                else:
-                    print("Invalid AQI data format.")
+            data = header + uart_serial.read(PMS7003_FRAME.size - 2)  # PMS7003 sends 32 bytes of data
+            if len(data) == PMS7003_FRAME.size:
+                fields = PMS7003_FRAME.unpack_from(data)
+                if sum(data[:-2]) & 0xffff != fields[-1]:
+                    print("AQI data checksum mismatch.")
+                    return None
+                pm1_0, pm2_5, pm10 = fields[2:5]
+                pollution_data = {"pm1_0": pm1_0, "pm2_5": pm2_5, "pm10": pm10}
+                print(f"AQI Data: PM1.0={pm1_0}, PM2.5={pm2_5}, PM10={pm10}")
+                return pollution_data
             else:
-                print("Not enough data from AQI sensor.")
+                print("Invalid AQI data format.")
         except serial.SerialException as e:
             print(f"Error reading from AQI sensor: {e}")
     return None
 
-def get_gps_location():
-    """Reads and parses GPS data."""
+# Fields of the position sentences read by get_gps_location:
+# sentence type -> (index of latitude, index of status or None, log label)
+NMEA_POSITION_FIELDS = {
+    '$GPGGA': (2, None, ''),
+    '$GPRMC': (3, 2, ' (RMC)'),  # status 'A' indicates a valid fix
+}
+
+def nmea_checksum_ok(sentence):
+    """Checks the '*hh' checksum of an NMEA sentence (sentences without one are accepted)."""
+    body, separator, checksum = sentence[1:].partition('*')
+    if not separator:
+        return True
+    try:
+        return reduce(operator.xor, body.encode('ascii'), 0) == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+def nmea_to_degrees(value, hemisphere):
+    """Converts an NMEA (D)DDMM.MMMM coordinate to signed decimal degrees."""
+    raw = float(value)
+    degrees = int(raw // 100)
+    decimal = degrees + (raw - degrees * 100) / 60.0
+    return -decimal if hemisphere in ('S', 'W') else decimal
+
+def parse_nmea_position(sentence):
+    """
+    Parses the latitude and longitude of a $GPGGA or $GPRMC sentence by splitting
+    its fields, without going through pynmea2.
+    Returns (latitude, longitude, label), or None if the sentence has no valid fix.
+    Raises ValueError if the sentence is malformed.
+    """
+    if not nmea_checksum_ok(sentence):
+        raise ValueError(f"checksum mismatch in {sentence!r}")
+    fields = sentence.partition('*')[0].split(',')
+    lat_index, status_index, label = NMEA_POSITION_FIELDS[fields[0]]
+    if len(fields) < lat_index + 4:
+        raise ValueError(f"too few fields in {sentence!r}")
+    if status_index is not None and fields[status_index] != 'A':
+        return None
+    lat, lat_dir, lon, lon_dir = fields[lat_index:lat_index + 4]
+    if not lat or not lon:
+        return None
+    return nmea_to_degrees(lat, lat_dir), nmea_to_degrees(lon, lon_dir), label
+
+def get_gps_location(start):
+    """Reads and parses a GPS sentence whose leading '$' has already been read."""
     global current_location
-    if gps_serial:
+    if uart_serial:
         try:
-            sentence = gps_serial.readline().decode('utf-8', errors='ignore').strip()
-            if sentence.startswith('$GPGGA'):
-                msg = pynmea2.parse(sentence)
-                if msg.latitude and msg.longitude:
-                    current_location = (msg.latitude, msg.longitude)
-                    print(f"GPS Location: Latitude={msg.latitude}, Longitude={msg.longitude}")
+            sentence = (start + uart_serial.readline()).decode('utf-8', errors='ignore').strip()
+            sentence_type = sentence.split(',', 1)[0]
+            if sentence_type in NMEA_POSITION_FIELDS:
+                position = parse_nmea_position(sentence)
+                if position:
+                    latitude, longitude, label = position
+                    current_location = (latitude, longitude)
+                    print(f"GPS Location{label}: Latitude={latitude}, Longitude={longitude}")
                     return current_location
-            elif sentence.startswith('$GPRMC'):
+            elif sentence_type.endswith(('GGA', 'RMC')):
+                # Other talkers (e.g. $GNGGA) are rare here; let pynmea2 handle them.
                 msg = pynmea2.parse(sentence)
-                if msg.latitude and msg.longitude and msg.status == 'A': # 'A' indicates a valid fix
+                if msg.latitude and msg.longitude and getattr(msg, 'status', 'A') == 'A':
                     current_location = (msg.latitude, msg.longitude)
-                    print(f"GPS Location (RMC): Latitude={msg.latitude}, Longitude={msg.longitude}")
+                    print(f"GPS Location ({msg.sentence_type}): Latitude={msg.latitude}, Longitude={msg.longitude}")
                     return current_location
         except serial.SerialException as e:
             print(f"Error reading from GPS: {e}")
-        except pynmea2.ParseError as e:
+        except (ValueError, pynmea2.ParseError) as e:
             print(f"Error parsing GPS data: {e}")
     return None
 
+def uart_demux():
+    """
+    Reads the shared UART and dispatches each message by its first bytes:
+    0x42 0x4d starts a PMS7003 frame (recorded in aqi_readings), '$' starts a GPS sentence
+    (recorded in gps_fixes). Anything else is noise between messages and is skipped.
+    """
+    pending = b''  # a byte already read that still has to be dispatched
+    while uart_serial.is_open:
+        try:
+            start = pending or uart_serial.read(1)
+            pending = b''
+            if start == b'\x42':
+                second = uart_serial.read(1)
+                if second != b'\x4d':
+                    # A stray 0x42, not a frame; the next byte may start a GPS sentence.
+                    pending = second
+                    continue
+        except serial.SerialException as e:
+            if not uart_serial.is_open:
+                return  # Port closed on shutdown
+            # Often transient (e.g. "device reports readiness to read but returned no data");
+            # keep reading, since this thread is the only reader for AQI and GPS.
+            print(f"Error reading from serial port {SERIAL_PORT}: {e}")
+            pending = b''
+            time.sleep(UART_RETRY_DELAY)
+            continue
+        if start == b'\x42':
+            pollution = read_aqi(start + second)
+            if pollution:
+                aqi_readings.append(pollution)
+                aqi_ready.set()
+        elif start == b'$':
+            location = get_gps_location(start)
+            if location:
+                gps_fixes.append((location[0], location[1], time.time()))
+
+def start_uart_demux():
+    """Starts the background thread reading the shared UART."""
+    if uart_serial:
+        threading.Thread(target=uart_demux, name="uart_demux", daemon=True).start()
+
 def send_data_to_gcs(image_path=None, distance=None, pollution=None, location=None):
     """
     Simulates sending data to the Ground Control Station (GCS).
@@ -143,36 +268,33 @@ def avoid_obstacle():
 
 def main_loop():
     """Main loop for data acquisition and processing."""
-    global last_camera_capture, last_aqi_read, last_gps_read
+    global last_camera_capture, last_aqi_read
 
+    start_uart_demux()
     while True:
         if avoid_obstacle():
             time.sleep(1)  # Give time for avoidance maneuver
             continue
 
         current_time = time.time()
+        current_location = gps_fixes[-1][:2] if gps_fixes else None
 
         # Capture image periodically
         if camera and current_time - last_camera_capture >= CAMERA_CAPTURE_INTERVAL:
-            image_path = capture_image()
-            send_data_to_gcs(image_path=image_path)
+            capture_image()
             last_camera_capture = current_time
 
-        # Read AQI data periodically
-        if aqi_serial and current_time - last_aqi_read >= AQI_READ_INTERVAL:
-            pollution_data = read_aqi()
-            if pollution_data and current_location:
-                send_data_to_gcs(pollution=pollution_data, location=current_location)
-            elif pollution_data:
-                print("No GPS location available yet, cannot send combined pollution and location data.")
-            last_aqi_read = current_time
-
-        # Read GPS data periodically
-        if gps_serial and current_time - last_gps_read >= GPS_READ_INTERVAL:
-            current_location = get_gps_location()
-            last_gps_read = current_time
-
-        time.sleep(0.1)  # Small delay to avoid busy-waiting
+        # Block until AQI data arrives, waking up in time for the next obstacle check
+        if aqi_ready.wait(timeout=OBSTACLE_CHECK_INTERVAL):
+            aqi_ready.clear()
+            pollution_data = aqi_readings[-1]
+            # Send AQI data periodically
+            if current_time - last_aqi_read >= AQI_READ_INTERVAL:
+                if current_location:
+                    send_data_to_gcs(pollution=pollution_data, location=current_location)
+                else:
+                    print("No GPS location available yet, cannot send combined pollution and location data.")
+                last_aqi_read = current_time
 
 if __name__ == "__main__":
     try:
@@ -180,11 +302,10 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nExiting...")
     finally:
+        image_writer.shutdown(wait=True)  # Finish writing captured images
         if camera:
             camera.close()
-        if aqi_serial and aqi_serial.is_open:
-            aqi_serial.close()
-        if gps_serial and gps_serial.is_open:
-            gps_serial.close()
+        if uart_serial and uart_serial.is_open:
+            uart_serial.close()
         if sensor:
             sensor.cleanup()
\ No newline at end of file
@@ -0,0 +1,57 @@
+# --- heatmap.py ---
+import numpy as np
+from scipy.stats import binned_statistic_2d
+import folium
+from folium.plugins import HeatMap
+
+HEATMAP_MAX_POINTS = 5000  # above this, points are averaged on a grid
+HEATMAP_BINS = 200         # grid cells per axis
+
+
+def heat_points(df, value_col, max_points=HEATMAP_MAX_POINTS, bins=HEATMAP_BINS):
+    """
+    Builds the [latitude, longitude, value] list for a Folium HeatMap.
+    Large frames are averaged on a bins x bins grid and only the non-empty cells are kept,
+    so the saved HTML stays small.
+
+    Args:
+        df: A pandas DataFrame with GPS data and the value column.
+        value_col: The name of the column used as the heat weight.
+        max_points: Frames with more rows than this are binned.
+        bins: Number of grid cells per axis when binning.
+
+    Returns:
+        A list of [latitude, longitude, value] lists.
+    """
+    points = df[['latitude', 'longitude', value_col]].to_numpy(dtype=np.float64, copy=False)
+    if len(points) <= max_points:
+        return points.tolist()
+    means, lat_edges, lon_edges, _ = binned_statistic_2d(
+        points[:, 0], points[:, 1], points[:, 2], statistic='mean', bins=bins)
+    lat_centers = (lat_edges[:-1] + lat_edges[1:]) / 2
+    lon_centers = (lon_edges[:-1] + lon_edges[1:]) / 2
+    lat_idx, lon_idx = np.nonzero(~np.isnan(means))
+    return np.column_stack((lat_centers[lat_idx], lon_centers[lon_idx], means[lat_idx, lon_idx])).tolist()
+
+
+def create_combined_heatmap(layers, filename="heatmap.html"):
+    """
+    Creates one Folium map with a toggleable heatmap layer per dataset,
+    instead of a separate map (and HTML file) for each.
+
+    Args:
+        layers: A dict mapping the layer name to a (DataFrame, value column) pair,
+            e.g. {'AQI': (aqi_df, 'aqi'), 'pH': (ph_df, 'ph')}.
+        filename: The name of the HTML file to save the heatmap to.
+    """
+    frames = [df for df, _ in layers.values()]
+    totals = sum(df[['latitude', 'longitude']].sum() for df in frames)
+    center = (totals / sum(len(df) for df in frames)).tolist()
+    m = folium.Map(location=center, zoom_start=10)
+    for name, (df, value_col) in layers.items():
+        layer = folium.FeatureGroup(name=name)
+        HeatMap(heat_points(df, value_col)).add_to(layer)
+        layer.add_to(m)
+    folium.LayerControl().add_to(m)
+    m.save(filename)
+    print(f"Combined Heatmap saved to {filename}")
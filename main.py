@@ -1,13 +1,16 @@
 import time
 import numpy as np
 import pandas as pd
-from aqi_processing import preprocess_aqi_data, create_aqi_heatmap, predict_aqi, plot_aqi_predictions
-from ph_processing import preprocess_ph_data, create_ph_heatmap, predict_ph, plot_ph_predictions
+from aqi_processing import preprocess_aqi_data, predict_aqi, plot_aqi_predictions
+from ph_processing import preprocess_ph_data, predict_ph, plot_ph_predictions
+from heatmap import create_combined_heatmap
+from time_features import add_time_features
 
 
-def get_simulated_data(num_samples=10):
+def get_simulated_data(num_samples=10, seed=None):
     """
     Generates simulated AQI and pH data.
+    Pass a seed for reproducible data.
     """
     center_lat = 37.7749
     center_lon = -122.4194
@@ -17,15 +20,16 @@ def get_simulated_data(num_samples=10):
     aqi_max = 200
     ph_min = 6.0
     ph_max = 8.5
-    
+
+    rng = np.random.default_rng(seed)
     data = {
-        'latitude': np.random.uniform(center_lat - lat_range, center_lat + lat_range, num_samples),
-        'longitude': np.random.uniform(center_lon - lon_range, center_lon + lon_range, num_samples),
-        'aqi': np.random.randint(aqi_min, aqi_max, num_samples).astype(float),
-        'ph': np.random.uniform(ph_min, ph_max, num_samples).astype(float),
-        'timestamp': [time.time() + i * 600 for i in range(num_samples)]
+        'latitude': rng.uniform(center_lat - lat_range, center_lat + lat_range, num_samples),
+        'longitude': rng.uniform(center_lon - lon_range, center_lon + lon_range, num_samples),
+        'aqi': rng.integers(aqi_min, aqi_max, num_samples).astype(np.float64),
+        'ph': rng.uniform(ph_min, ph_max, num_samples),
+        'timestamp': time.time() + np.arange(num_samples, dtype=np.float64) * 600.0,
     }
-    return pd.DataFrame(data)
+    return pd.DataFrame(data, copy=False)  # skips the per-column copy; pandas still consolidates the columns
 
 
 
@@ -36,26 +40,27 @@ def main():
     # 1. Get the  data (simulated in this example).
     data = get_simulated_data(num_samples=20)
 
-    # 2. Preprocess the data.
-    aqi_data = preprocess_aqi_data(data.copy())  # Pass a copy to each
-    ph_data = preprocess_ph_data(data.copy())    # function to avoid modifying original
+    # 2. Preprocess the data. The time features are shared, so compute them once;
+    #    the preprocess_* functions only filter and never modify their input.
+    data = add_time_features(data)
+    aqi_data = preprocess_aqi_data(data)
+    ph_data = preprocess_ph_data(data)
 
-    # 3. Create  heatmaps.
-    create_aqi_heatmap(aqi_data, filename="aqi_heatmap.html")
-    create_ph_heatmap(ph_data, filename="ph_heatmap.html")
+    # 3. Create the heatmaps, as two layers of one map.
+    create_combined_heatmap({'AQI': (aqi_data, 'aqi'), 'pH': (ph_data, 'ph')}, filename="heatmap.html")
 
     # 4. Predict future  levels.
-    future_aqi_predictions = predict_aqi(aqi_data.copy())
-    future_ph_predictions = predict_ph(ph_data.copy())
+    future_aqi_predictions = predict_aqi(aqi_data)
+    future_ph_predictions = predict_ph(ph_data)
 
     # 5. Print and plot the predictions.
     print("\nFuture AQI Predictions:")
     print(future_aqi_predictions)
-    plot_aqi_predictions(future_aqi_predictions)
+    plot_aqi_predictions(future_aqi_predictions, filename="aqi_predictions.png")
 
     print("\nFuture pH Predictions:")
     print(future_ph_predictions)
-    plot_ph_predictions(future_ph_predictions)
+    plot_ph_predictions(future_ph_predictions, filename="ph_predictions.png")
 
 
 
@@ -0,0 +1,41 @@
+# --- model_cache.py ---
+import os
+import hashlib
+import joblib
+import pandas as pd
+
+
+def _training_hash(model, X, y):
+    hasher = hashlib.sha1(repr(sorted(model.get_params().items())).encode())
+    hasher.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    hasher.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def fit_cached(model, X, y, filename):
+    """
+    Fits the model, or loads it from filename if it was already fitted there
+    with the same parameters on the same training data.
+
+    Args:
+        model: An unfitted scikit-learn estimator.
+        X: The training features.
+        y: The training target.
+        filename: The joblib file the fitted model is saved to.
+
+    Returns:
+        The fitted model.
+    """
+    training_hash = _training_hash(model, X, y)
+    if os.path.exists(filename):
+        try:
+            cached = joblib.load(filename)
+            if cached['training_hash'] == training_hash:
+                print(f"Loaded fitted model from {filename}")
+                return cached['model']
+        except Exception as e:
+            # Truncated file, older format or another sklearn version: refit instead
+            print(f"Ignoring cached model {filename}: {e}")
+    model.fit(X, y)
+    joblib.dump({'training_hash': training_hash, 'model': model}, filename, compress=3)
+    return model
@@ -0,0 +1,56 @@
+# --- time_features.py ---
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+FEATURES = ['latitude', 'longitude', 'hour_of_day', 'day_of_week']
+# Narrowest dtypes that hold the features (float32 keeps positions to about 1 m)
+FEATURE_DTYPES = {'latitude': 'float32', 'longitude': 'float32', 'hour_of_day': 'uint8', 'day_of_week': 'uint8'}
+
+
+def add_time_features(df):
+    """
+    Adds the time-based features (hour of day, day of week) derived from the Unix timestamps.
+    Done once on the raw readings so the AQI and pH pipelines can share it.
+
+    Args:
+        df: A pandas DataFrame with a Unix 'timestamp' column.
+
+    Returns:
+        A new pandas DataFrame with 'hour_of_day' and 'day_of_week' columns added.
+        Readings without a timestamp are dropped.
+    """
+    df = df.dropna(subset=['timestamp'])  # NaN would become INT64_MIN in the integer cast
+    ts = df['timestamp'].to_numpy(dtype=np.int64)  # Unix seconds (UTC)
+    return df.assign(
+        hour_of_day=(ts // 3600) % 24,
+        day_of_week=(ts // 86400 + 3) % 7,  # 1970-01-01 was a Thursday (Monday=0)
+    )
+
+
+@lru_cache(maxsize=4)
+def _future_frame(last_time, latitude, longitude):
+    future_times = pd.to_datetime([last_time + pd.Timedelta(minutes=i*15) for i in range(1, 5)])
+    future_df = pd.DataFrame({
+        'datetime': future_times,
+        'latitude': [latitude] * len(future_times),
+        'longitude': [longitude] * len(future_times),
+    })
+    future_df['hour_of_day'] = future_df['datetime'].dt.hour
+    future_df['day_of_week'] = future_df['datetime'].dt.dayofweek
+    return future_df.astype(FEATURE_DTYPES)
+
+
+def build_future_frame(df):
+    """
+    Builds the feature frame for the next hour (four 15 minute steps) after the
+    last reading, located at the mean position of the readings.
+    The frame is cached, so the AQI and pH predictions on the same readings share it.
+
+    Args:
+        df: A pandas DataFrame with GPS data and a Unix 'timestamp' column.
+
+    Returns:
+        A pandas DataFrame with 'datetime' and the model features. Do not modify it in place.
+    """
+    return _future_frame(pd.to_datetime(df['timestamp'].max(), unit='s'), df['latitude'].mean(), df['longitude'].mean())